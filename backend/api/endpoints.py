@@ -1,97 +1,299 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Path, Query, Body
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Path, Query, Body
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional
 from datetime import datetime, timezone
-from core.db import db, insert_parsed_logs_to_db, insert_issue, delete_specified_issue, update_issue_status, get_issues, get_issue_by_id
-from core.es import insert_logfile_to_es, fetch_log_entry, fetch_log_datetime, fetch_log_line_number, es
+from core.db import db_connection, ping_db, insert_parsed_logs_to_db, insert_issue, delete_specified_issue, update_issue_status, create_upload, complete_upload, copy_upload
+from core.es import insert_logfile_to_es, get_es
+from core.async_db import ping_pool, get_issues, get_issue_by_id, find_upload_by_hash, get_issue_occurrences, get_issue_traceback, get_top_issues, upload_exists, get_issue_diff, iter_issue_diff, iter_issues_export, iter_tracebacks_export, ISSUE_EXPORT_COLUMNS, TRACEBACK_EXPORT_COLUMNS
+from core.async_es import ping_async_es, fetch_log_entry, fetch_log_datetime, fetch_log_line_number
 from core.parser import parse_log_file, generate_log_id_hash, get_log_hash
+from core.dialects import get_profiles, detect_file_dialect
+from core.startup import is_ready
+from core.columnar import write_columnar
 from core.logger import logger
 
+import asyncio
+import tempfile
+import hashlib
 import json
+import csv
+import io
 import os
 
 BASE_DIR = os.getcwd()
 LOG_DIR = "/app/data/logs"
+PARSED_OUTPUT_FORMATS = os.getenv("PARSED_OUTPUT_FORMATS", "jsonl,columnar").split(",")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
 
 router = APIRouter()
 
+# Health
+@router.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz():
+    checks = {"warm_up": is_ready(), "postgres": False, "postgres_ingest": False, "elasticsearch": False}
+    if checks["warm_up"]:
+        checks["postgres"], checks["postgres_ingest"], checks["elasticsearch"] = await asyncio.gather(
+            ping_pool(), asyncio.to_thread(ping_db), ping_async_es()
+        )
+    if not all(checks.values()):
+        return JSONResponse(status_code=503, content={"status": "not ready", "checks": checks})
+    return {"status": "ready", "checks": checks}
+
 # Accept the incoming logfiles
 @router.post("/logs")
-async def collect_logfile(file: UploadFile = File(...)):
+async def collect_logfile(file: UploadFile = File(...), build: Optional[str] = Form(None), dialect: Optional[str] = Form(None)):
+    if dialect and dialect not in get_profiles():
+        raise HTTPException(status_code=400, detail=f"Unknown log dialect '{dialect}'")
+    partial_filename = None
     try:
-        content = await file.read()
         file_basename = (file.filename).split(os.path.sep)
         if len(file_basename) > 1:
             file.filename = file_basename[-1]
         filename = os.path.join(LOG_DIR, file.filename)
         os.makedirs(LOG_DIR, exist_ok=True)
-        
-        with open(filename, "wb") as f:
-            f.write(content)
+
+        # hash the content while it is written, identical logs are detected before any parsing
+        content_hash = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=LOG_DIR, prefix=".upload_", suffix=".part", delete=False) as f:
+            partial_filename = f.name
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                content_hash.update(chunk)
+                f.write(chunk)
+        digest = content_hash.hexdigest()
+        # resolved before the lookup, so an explicitly requested dialect matching the detected one still reuses the upload
+        dialect = dialect or await run_in_threadpool(detect_file_dialect, partial_filename)
+
+        existing_upload = await find_upload_by_hash(digest, dialect, build)
+        if existing_upload:
+            if build is not None and existing_upload["build"] != build:
+                # the same log of another build still counts as an upload of that build
+                upload_id = await run_in_threadpool(register_duplicate_upload, existing_upload, build)
+                logger.info(f"Uploaded file: {file.filename} is identical to upload {existing_upload['id']}, registered as upload {upload_id} of build {build}")
+                return {"filename": existing_upload["filename"], "upload_id": upload_id, "parsed": existing_upload["parsed"], "duplicate": True}
+            logger.info(f"Uploaded file: {file.filename} is identical to upload {existing_upload['id']}, skipping")
+            return {
+                "filename": existing_upload["filename"],
+                "upload_id": existing_upload["id"],
+                "parsed": existing_upload["parsed"],
+                "duplicate": True
+            }
+
+        os.replace(partial_filename, filename)
+        partial_filename = None
         logger.info(f"Uploaded file: {filename}")
 
-        parsed_entries = parse_log_file(filename)
-        logger.info(f"Parsed logfile: {file.filename}")
+        # parsing and inserting is blocking, keep it off the event loop so reads are still served
+        return await run_in_threadpool(process_logfile, filename, build, dialect, digest)
+    except Exception as e:
+        logger.error(f"Caught exception: {e}")
+        raise HTTPException(status_code=500, detail="Failed to process logfile")
+    finally:
+        if partial_filename and os.path.exists(partial_filename):
+            os.remove(partial_filename)
+
+def process_logfile(filename, build, dialect, digest):
+    basename = os.path.basename(filename)
+    parsed_entries = parse_log_file(filename, dialect)
+    logger.info(f"Parsed logfile: {basename}")
 
-        basename = os.path.basename(filename)
-        deduplicated_entries = deduplicate_logs_by_hash(parsed_entries)
+    deduplicated_entries = deduplicate_logs_by_hash(parsed_entries)
+    if "jsonl" in PARSED_OUTPUT_FORMATS:
         with open(os.path.join(LOG_DIR, f"parsed_{basename}"), "wb") as f:
             for entry in deduplicated_entries:
                 line = json.dumps(entry, default=str) + "\n"
                 f.write(line.encode("utf-8"))
+    if "columnar" in PARSED_OUTPUT_FORMATS:
+        write_columnar(os.path.join(LOG_DIR, f"parsed_{basename}.npz"), deduplicated_entries)
 
-        insert_parsed_logs_to_db(parsed_entries)
-        insert_logfile_to_es(filename)
-        return {
-            "filename": basename,
-            "parsed": len(parsed_entries)
-        }
-    except Exception as e:
-        logger.error(f"Caught exception: {e}")
+    # lines are indexed first, their ids are derived from the content so indexing them again after a failed upload is harmless
+    insert_logfile_to_es(filename)
+    # the upload is completed in the same transaction as its issues, a failed ingest is never reused for an identical upload
+    with db_connection() as db:
+        upload_id = create_upload(db, basename, build, digest, dialect)
+        insert_parsed_logs_to_db(db, deduplicated_entries, upload_id)
+        complete_upload(db, upload_id, len(parsed_entries))
+    return {
+        "filename": basename,
+        "upload_id": upload_id,
+        "parsed": len(parsed_entries)
+    }
+
+def register_duplicate_upload(existing_upload, build):
+    with db_connection() as db:
+        return copy_upload(db, existing_upload["id"], build)
 
 # Elasticsearch
 @router.get("/logs/{log_entry_id}")
-def get_log_by_id(log_entry_id: str):
-    result = fetch_log_entry(log_entry_id)
+async def get_log_by_id(log_entry_id: str):
+    try:
+        result = await fetch_log_entry(log_entry_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Elasticsearch request timed out")
+    except ConnectionError:
+        raise HTTPException(status_code=503, detail="Elasticsearch is not available")
     if result is None:
         raise HTTPException(status_code=404, detail="Log entry not found")
     return result
 
 @router.get("/logs/{log_entry_id}/line_number")
-def get_log_line(log_entry_id: str):
-    line_number = fetch_log_line_number(log_entry_id)
+async def get_log_line(log_entry_id: str):
+    try:
+        line_number = await fetch_log_line_number(log_entry_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Elasticsearch request timed out")
+    except ConnectionError:
+        raise HTTPException(status_code=503, detail="Elasticsearch is not available")
     if line_number is None:
         raise HTTPException(status_code=404, detail="Line number not found")
     return {"line_number": line_number}
 
 @router.get("/logs/{log_entry_id}/datetime")
-def get_log_datetime(log_entry_id: str):
-    datetime_value = fetch_log_datetime(log_entry_id)
+async def get_log_datetime(log_entry_id: str):
+    try:
+        datetime_value = await fetch_log_datetime(log_entry_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Elasticsearch request timed out")
+    except ConnectionError:
+        raise HTTPException(status_code=503, detail="Elasticsearch is not available")
     if datetime_value is None:
         raise HTTPException(status_code=404, detail="Timestamp not found")
     return {"datetime": datetime_value}
 
 # Postgres 
+@router.get("/issues/top")
+async def list_top_issues(limit: int = Query(10, ge=1, le=1000), status: Optional[str] = Query(None)):
+    try:
+        return await get_top_issues(limit, status)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database request timed out")
+    except ConnectionError:
+        raise HTTPException(status_code=503, detail="Database is not available")
+    except Exception as e:
+        logger.error(f"API error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve top issues")
+
+@router.get("/issues/export")
+async def export_issues(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    severity: Optional[str] = Query(None)
+):
+    try:
+        batches = iter_issues_export(status, category, severity)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    return export_response(batches, ISSUE_EXPORT_COLUMNS, export_format, "issues")
+
+@router.get("/tracebacks/export")
+async def export_tracebacks(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    severity: Optional[str] = Query(None)
+):
+    try:
+        batches = iter_tracebacks_export(status, category, severity)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    return export_response(batches, TRACEBACK_EXPORT_COLUMNS, export_format, "tracebacks")
+
+@router.get("/issues/{issue_id}/occurrences")
+async def list_issue_occurrences(issue_id: int):
+    try:
+        return await get_issue_occurrences(issue_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database request timed out")
+    except ConnectionError:
+        raise HTTPException(status_code=503, detail="Database is not available")
+    except Exception as e:
+        logger.error(f"API error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve issue occurrences")
+
+@router.get("/issues/{issue_id}/traceback")
+async def get_traceback(issue_id: int):
+    try:
+        traceback = await get_issue_traceback(issue_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database request timed out")
+    except ConnectionError:
+        raise HTTPException(status_code=503, detail="Database is not available")
+    if not traceback:
+        raise HTTPException(status_code=404, detail="Traceback not found")
+    return traceback
+
 @router.get("/issues/{issue_id}")
-def get_issue(log_entry_id: str):
-    issue = get_issue_by_id(log_entry_id)
+async def get_issue(issue_id: int):
+    try:
+        issue = await get_issue_by_id(issue_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database request timed out")
+    except ConnectionError:
+        raise HTTPException(status_code=503, detail="Database is not available")
     if not issue:
         raise HTTPException(status_code=404, detail="Issue not found")
     return issue
 
 @router.get("/issues")
-def list_issues(status: Optional[str] = Query(None)):
+async def list_issues(
+    status: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    severity: Optional[str] = Query(None)
+):
     try:
-        return get_issues(status)
+        return await get_issues(status, category, severity)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database request timed out")
+    except ConnectionError:
+        raise HTTPException(status_code=503, detail="Database is not available")
     except Exception as e:
         logger.error(f"API error: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve issues")
 
+@router.get("/diff")
+async def diff_uploads(
+    base: int = Query(...),
+    head: int = Query(...),
+    category: Optional[str] = Query(None),
+    severity: Optional[str] = Query(None),
+    stream: bool = Query(False)
+):
+    try:
+        for upload_id in (base, head):
+            if not await upload_exists(upload_id):
+                raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+        if stream:
+            rows = iter_issue_diff(base, head, category, severity)
+            return StreamingResponse(
+                (json.dumps(row, default=str) + "\n" async for row in rows),
+                media_type="application/x-ndjson"
+            )
+        return await get_issue_diff(base, head, category, severity)
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database request timed out")
+    except ConnectionError:
+        raise HTTPException(status_code=503, detail="Database is not available")
+    except Exception as e:
+        logger.error(f"API error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute diff")
+
 @router.patch("/issues/{issue_id}")
 def patch_issue_status(issue_id: str, new_status: str = Body(..., embed=True)):
     try:
-        updated = update_issue_status(issue_id, new_status)
+        with db_connection() as db:
+            updated = update_issue_status(db, issue_id, new_status)
         if not updated:
             raise HTTPException(status_code=404, detail="Issue not found")
         return {"message": f"Issue {issue_id} status updated to '{new_status}'"}
@@ -103,7 +305,8 @@ def patch_issue_status(issue_id: str, new_status: str = Body(..., embed=True)):
 @router.delete("/issues/{issue_id}")
 def delete_issue(issue_id: str = Path(...)):
     try:
-        deleted = delete_specified_issue(issue_id)
+        with db_connection() as db:
+            deleted = delete_specified_issue(db, issue_id)
         if not deleted:
             raise HTTPException(status_code=404, detail="Issue not found")
         return {"message": f"Issue {issue_id} deleted."}
@@ -121,8 +324,9 @@ def create_issue(
     try:
         timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S%z")
         log_entry_id = generate_log_id_hash(str(timestamp), None, line_number, message)
-        issue_id, _ = insert_issue(get_log_hash(message), log_entry_id, message, timestamp, category, severity, line_number, status)
-        db.commit()
+        with db_connection() as db:
+            issue_id, _ = insert_issue(db, get_log_hash(message), log_entry_id, message, timestamp, category, severity, line_number, status)
+            db.commit()
         issue_doc = {
             "message": message,
             "category": category,
@@ -133,20 +337,47 @@ def create_issue(
             "log_entry_id": log_entry_id,
             "issue_id": issue_id,
         }
-        es.index(index="logs", id=issue_id, body=issue_doc)
+        get_es().index(index="logs", id=issue_id, body=issue_doc)
 
         return {"message": f"Issue {issue_id} - inserted successfully"}
     except Exception as e:
-        db.rollback()
         logger.error(f"Error creating issue: {e}")
         raise HTTPException(status_code=500, detail="Failed to create issue")
 
+# Keeps the first entry of every message hash, with the number of times it occurred in the logfile
 def deduplicate_logs_by_hash(entries):
-    seen_hashes = set()
-    deduplicated = []
+    first_by_hash = {}
     for entry in entries:
         msg_hash = entry.get("message_hash")
-        if msg_hash and msg_hash not in seen_hashes:
-            seen_hashes.add(msg_hash)
-            deduplicated.append(entry)
-    return deduplicated
+        if not msg_hash:
+            continue
+        first = first_by_hash.get(msg_hash)
+        if first is None:
+            entry["occurrences"] = 1
+            first_by_hash[msg_hash] = entry
+        else:
+            first["occurrences"] += 1
+    return list(first_by_hash.values())
+
+# Every fetched batch of rows is written out as one chunk of the response
+async def stream_export(batches, columns, export_format):
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        yield buffer.getvalue()
+        async for rows in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+    else:
+        async for rows in batches:
+            yield "".join(json.dumps(row, default=str) + "\n" for row in rows)
+
+def export_response(batches, columns, export_format, name):
+    return StreamingResponse(
+        stream_export(batches, columns, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f"attachment; filename={name}.{export_format}"}
+    )
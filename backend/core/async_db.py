@@ -0,0 +1,264 @@
+from .logger import logger
+from .retry import async_connect_with_retry
+import asyncpg
+import asyncio
+import os
+
+READ_TIMEOUT = float(os.getenv("DB_READ_TIMEOUT", "10"))
+EXPORT_FETCH_SIZE = int(os.getenv("DB_EXPORT_FETCH_SIZE", "1000"))
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+EXPORT_MAX_CONCURRENCY = int(os.getenv("DB_EXPORT_MAX_CONCURRENCY", "4"))
+
+_pool = None
+_pool_lock = asyncio.Lock()
+_export_slots = asyncio.Semaphore(EXPORT_MAX_CONCURRENCY)
+
+def connection_settings():
+    return {
+        "host": os.getenv("POSTGRES_HOST", "postgres"),
+        "database": os.getenv("POSTGRES_DB", "logs_db"),
+        "user": os.getenv("POSTGRES_USER", "user"),
+        "password": os.getenv("POSTGRES_PASSWORD", "pass"),
+    }
+
+async def create_pool():
+    return await asyncpg.create_pool(
+        **connection_settings(),
+        timeout=READ_TIMEOUT,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+    )
+
+# Read queries go through this pool, so they do not block the event loop or wait for the ingest connection
+async def get_pool(attempts=None):
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await async_connect_with_retry(create_pool, "Postgres pool", attempts)
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+# The whole read, connecting and waiting for a free pooled connection included, has to finish within READ_TIMEOUT.
+# Reads do not retry connecting, an unavailable database is reported as ConnectionError right away
+async def read(method: str, query: str, *args):
+    async def run():
+        try:
+            pool = await get_pool(attempts=1)
+            async with pool.acquire() as connection:
+                return await getattr(connection, method)(query, *args)
+        except asyncio.TimeoutError:
+            raise
+        except (OSError, asyncpg.PostgresConnectionError, asyncpg.CannotConnectNowError, asyncpg.InterfaceError) as e:
+            raise ConnectionError(f"Postgres is not available: {e}") from e
+    return await asyncio.wait_for(run(), READ_TIMEOUT)
+
+async def ping_pool():
+    try:
+        await read("fetchval", "SELECT 1;")
+        return True
+    except Exception as e:
+        logger.warning(f"Postgres pool ping failed: {e}")
+        return False
+
+def issue_to_dict(row):
+    return {
+        "id": row.get("id"),
+        "log_entry_id": row.get("log_entry_id"),
+        "message": row.get("message"),
+        "category": row.get("category", "unknown"),
+        "timestamp": row.get("timestamp", None),
+        "status": row.get("status", "open"),
+    }
+
+# Builds the WHERE clause shared by the issue listing and exports
+def issue_filters(status=None, category=None, severity=None, alias="i"):
+    if status and status not in ["open", "closed"]:
+        raise ValueError("Invalid status filter")
+    conditions, args = [], []
+    for column, value in (("status", status), ("category", category), ("severity", severity)):
+        if value:
+            args.append(value)
+            conditions.append(f"{alias}.{column} = ${len(args)}")
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    return where, args
+
+# Reads the query result through a server-side cursor in batches of fetch_size rows, so memory use does not grow with the result.
+# A stream holds its connection until the client has downloaded everything, so streams use their own connections
+# (at most DB_EXPORT_MAX_CONCURRENCY at once) and never take connections of the read pool
+async def iter_batches(query, *args, fetch_size=EXPORT_FETCH_SIZE):
+    async with _export_slots:
+        connection = await asyncpg.connect(**connection_settings(), timeout=READ_TIMEOUT)
+        try:
+            async with connection.transaction(readonly=True):
+                cursor = await connection.cursor(query, *args, timeout=READ_TIMEOUT)
+                # the first row is sent as soon as it is read, the rest in full batches
+                batch_size = 1
+                while rows := await cursor.fetch(batch_size, timeout=READ_TIMEOUT):
+                    yield [dict(row) for row in rows]
+                    batch_size = fetch_size
+        finally:
+            await connection.close()
+
+async def get_issues(status=None, category=None, severity=None):
+    where, args = issue_filters(status, category, severity)
+    try:
+        rows = await read("fetch", f"SELECT * FROM issues i {where};", *args)
+        return [issue_to_dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"DB error fetching issues: {e}")
+        raise
+
+async def get_issue_by_id(issue_id: int):
+    try:
+        issue = await read("fetchrow", "SELECT * FROM issues WHERE id = $1;", issue_id)
+        if not issue:
+            return None
+        return issue_to_dict(issue)
+    except Exception as e:
+        logger.error(f"DB error fetching issue by ID {issue_id}: {e}")
+        raise
+
+async def get_issue_occurrences(issue_id: int):
+    try:
+        rows = await read("fetch", """
+            SELECT u.id AS upload_id, u.filename, u.build, u.uploaded_at, o.count
+            FROM issue_occurrences o
+            JOIN uploads u ON u.id = o.upload_id
+            WHERE o.issue_id = $1
+            ORDER BY u.uploaded_at, u.id;
+        """, issue_id)
+        return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"DB error fetching occurrences for issue {issue_id}: {e}")
+        raise
+
+async def get_issue_traceback(issue_id: int):
+    try:
+        row = await read("fetchrow", """
+            SELECT t.issue_id, t.line_number,
+                   ARRAY(
+                       SELECT f.message
+                       FROM unnest(t.frame_ids) WITH ORDINALITY AS u(frame_id, position)
+                       JOIN traceback_frames f ON f.id = u.frame_id
+                       ORDER BY u.position
+                   ) AS frames
+            FROM issue_tracebacks t
+            WHERE t.issue_id = $1;
+        """, issue_id)
+        return dict(row) if row else None
+    except Exception as e:
+        logger.error(f"DB error fetching traceback for issue {issue_id}: {e}")
+        raise
+
+async def get_top_issues(limit=10, status=None):
+    if status and status not in ["open", "closed"]:
+        raise ValueError("Invalid status filter")
+    try:
+        rows = await read("fetch", """
+            SELECT id, log_entry_id, message, category, severity, status, occurrence_count, last_seen_upload_id
+            FROM issues
+            WHERE ($1::text IS NULL OR status = $1)
+            ORDER BY occurrence_count DESC LIMIT $2;
+        """, status, limit)
+        return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"DB error fetching top issues: {e}")
+        raise
+
+# Prefers an upload of the same build, so a retried build is reported as is instead of being registered again
+# the same file parsed with another dialect gives different issues, so it is only reused for the same dialect
+async def find_upload_by_hash(content_hash, dialect, build=None):
+    try:
+        row = await read("fetchrow", """
+            SELECT id, filename, build, parsed FROM uploads
+            WHERE content_hash = $1 AND dialect = $2 AND parsed IS NOT NULL
+            ORDER BY build IS NOT DISTINCT FROM $3 DESC, id LIMIT 1;
+        """, content_hash, dialect, build)
+        return dict(row) if row else None
+    except Exception as e:
+        logger.error(f"DB error fetching upload by content hash: {e}")
+        raise
+
+async def upload_exists(upload_id: int):
+    try:
+        return await read("fetchval", "SELECT 1 FROM uploads WHERE id = $1;", upload_id) is not None
+    except Exception as e:
+        logger.error(f"DB error fetching upload {upload_id}: {e}")
+        raise
+
+ISSUE_DIFF_QUERY = """
+    SELECT i.id, i.log_entry_id, i.message, i.category, i.severity, i.status,
+           CASE
+               WHEN b.issue_id IS NULL THEN 'new'
+               WHEN h.issue_id IS NULL THEN 'resolved'
+               ELSE 'persisting'
+           END AS change,
+           b.count AS base_count,
+           h.count AS head_count
+    FROM (SELECT issue_id, count FROM issue_occurrences WHERE upload_id = $2) h
+    FULL OUTER JOIN (SELECT issue_id, count FROM issue_occurrences WHERE upload_id = $1) b
+        ON b.issue_id = h.issue_id
+    JOIN issues i ON i.id = COALESCE(h.issue_id, b.issue_id)
+    WHERE ($3::text IS NULL OR i.category = $3)
+      AND ($4::text IS NULL OR i.severity = $4)
+    ORDER BY change, i.id;
+"""
+
+async def get_issue_diff(base: int, head: int, category=None, severity=None):
+    try:
+        rows = await read("fetch", ISSUE_DIFF_QUERY, base, head, category, severity)
+        diff = {"new": [], "resolved": [], "persisting": []}
+        for row in rows:
+            diff[row["change"]].append(dict(row))
+        return diff
+    except Exception as e:
+        logger.error(f"DB error computing diff between uploads {base} and {head}: {e}")
+        raise
+
+async def iter_issue_diff(base: int, head: int, category=None, severity=None):
+    try:
+        async for rows in iter_batches(ISSUE_DIFF_QUERY, base, head, category, severity):
+            for row in rows:
+                yield row
+    except Exception as e:
+        logger.error(f"DB error streaming diff between uploads {base} and {head}: {e}")
+        raise
+
+ISSUE_EXPORT_COLUMNS = ["id", "log_entry_id", "message", "category", "severity", "timestamp", "line_number", "status", "occurrence_count"]
+TRACEBACK_EXPORT_COLUMNS = ["issue_id", "log_entry_id", "category", "severity", "position", "line_number", "message"]
+
+async def log_export_errors(batches, name):
+    try:
+        async for rows in batches:
+            yield rows
+    except Exception as e:
+        logger.error(f"DB error exporting {name}: {e}")
+        raise
+
+# Filters are validated right away, rows are only read while the export is streamed
+def iter_issues_export(status=None, category=None, severity=None):
+    where, args = issue_filters(status, category, severity)
+    query = f"SELECT {', '.join(ISSUE_EXPORT_COLUMNS)} FROM issues i {where} ORDER BY i.id;"
+    return log_export_errors(iter_batches(query, *args), "issues")
+
+def iter_tracebacks_export(status=None, category=None, severity=None):
+    where, args = issue_filters(status, category, severity)
+    query = f"""
+        SELECT t.issue_id, i.log_entry_id, i.category, i.severity, u.position,
+               t.line_number + u.position - 1 AS line_number, f.message
+        FROM issue_tracebacks t
+        JOIN issues i ON i.id = t.issue_id
+        CROSS JOIN LATERAL unnest(t.frame_ids) WITH ORDINALITY AS u(frame_id, position)
+        JOIN traceback_frames f ON f.id = u.frame_id
+        {where}
+        ORDER BY t.issue_id, u.position;
+    """
+    return log_export_errors(iter_batches(query, *args), "tracebacks")
@@ -0,0 +1,89 @@
+from elasticsearch import AsyncElasticsearch, NotFoundError, ConnectionTimeout, TransportError
+from .logger import logger
+from .retry import async_connect_with_retry
+from .es import DEFAULT_INDEX
+import asyncio
+import os
+
+READ_TIMEOUT = float(os.getenv("ES_READ_TIMEOUT", "10"))
+
+_es = None
+_es_lock = asyncio.Lock()
+
+async def connect_async_es():
+    client = AsyncElasticsearch(os.getenv("ELASTIC_URL", "http://elasticsearch:9200"))
+    if not await client.ping():
+        await client.close()
+        raise ConnectionError("Elasticsearch ping failed")
+    return client
+
+async def get_async_es(attempts=None):
+    global _es
+    if _es is None:
+        async with _es_lock:
+            if _es is None:
+                _es = await async_connect_with_retry(connect_async_es, "Elasticsearch", attempts)
+    return _es
+
+async def close_async_es():
+    global _es
+    if _es is not None:
+        await _es.close()
+        _es = None
+_es_lock = asyncio.Lock()
+
+async def ping_async_es():
+    try:
+        async def ping():
+            es = await get_async_es(attempts=1)
+            return await es.ping()
+        return await asyncio.wait_for(ping(), READ_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Elasticsearch ping failed: {e}")
+        return False
+
+# The whole read, connecting included, has to finish within READ_TIMEOUT. Reads do not retry connecting.
+# Timeouts and an unavailable Elasticsearch (ConnectionError) are raised to the caller, missing documents return None
+async def fetch_log_source(log_id: str):
+    async def get_source():
+        es = await get_async_es(attempts=1)
+        try:
+            res = await es.get(index=DEFAULT_INDEX, id=log_id)
+            return res["_source"]
+        except NotFoundError:
+            return None
+    try:
+        return await asyncio.wait_for(get_source(), READ_TIMEOUT)
+    except ConnectionTimeout as e:
+        raise asyncio.TimeoutError() from e
+    except TransportError as e:
+        raise ConnectionError(f"Elasticsearch is not available: {e}") from e
+
+async def fetch_log_entry(log_entry_id: str):
+    try:
+        return await fetch_log_source(log_entry_id)
+    except (asyncio.TimeoutError, ConnectionError):
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving log entry {log_entry_id}: {e}")
+        return None
+
+async def fetch_log_line_number(log_id: str):
+    try:
+        source = await fetch_log_source(log_id)
+        return source.get("line_number") if source else None
+    except (asyncio.TimeoutError, ConnectionError):
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving line number for log {log_id}: {e}")
+        return None
+
+async def fetch_log_datetime(log_id: str):
+    try:
+        source = await fetch_log_source(log_id)
+        return source.get("@timestamp") if source else None
+    except (asyncio.TimeoutError, ConnectionError):
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving timestamp for log {log_id}: {e}")
+        return None
@@ -0,0 +1,130 @@
+from datetime import datetime
+import numpy as np
+import argparse
+import glob
+import sys
+
+# Columnar (NumPy .npz) version of the parsed logfile, written next to the JSONL output.
+# Every column is a fixed width array, strings with few distinct values are dictionary encoded.
+SEVERITIES = np.array(["", "Error", "Warning", "Traceback"])
+COLUMNS = ("severity", "category", "categories", "message_hash", "timestamp", "line_number", "log_entry_id", "occurrences")
+GROUP_BY_KEYS = ("message_hash", "category", "severity", "file")
+
+def entries_to_columns(entries: list) -> dict:
+    severity_codes = {name: code for code, name in enumerate(SEVERITIES)}
+    category_codes = {}
+    count = len(entries)
+    severity = np.zeros(count, dtype=np.uint8)
+    category = np.zeros(count, dtype=np.int32)
+    message_hash = np.zeros(count, dtype="S32")
+    timestamp = np.full(count, np.datetime64("NaT"), dtype="datetime64[s]")
+    line_number = np.full(count, -1, dtype=np.int32)
+    log_entry_id = np.zeros(count, dtype="S20")
+    occurrences = np.ones(count, dtype=np.int32)
+
+    for i, entry in enumerate(entries):
+        severity[i] = severity_codes.get(entry.get("severity") or "", 0)
+        category[i] = category_codes.setdefault(entry.get("category") or "", len(category_codes))
+        if entry.get("message_hash"):
+            message_hash[i] = bytes.fromhex(entry["message_hash"])
+        if isinstance(entry.get("timestamp"), datetime):
+            timestamp[i] = np.datetime64(entry["timestamp"], "s")
+        if entry.get("line_number") is not None:
+            line_number[i] = entry["line_number"]
+        if entry.get("log_entry_id"):
+            log_entry_id[i] = entry["log_entry_id"].encode("ascii")
+        occurrences[i] = entry.get("occurrences", 1)
+
+    return {
+        "severity": severity,
+        "category": category,
+        "categories": np.array(list(category_codes), dtype=str),
+        "message_hash": message_hash,
+        "timestamp": timestamp,
+        "line_number": line_number,
+        "log_entry_id": log_entry_id,
+        "occurrences": occurrences,
+    }
+
+def write_columnar(path: str, entries: list):
+    with open(path, "wb") as f:
+        np.savez_compressed(f, **entries_to_columns(entries))
+
+def read_columnar(path: str) -> dict:
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in COLUMNS}
+
+# Reads many parsed files into one set of columns, category codes are remapped to a shared dictionary
+def load_columnar(paths: list) -> dict:
+    tables = [read_columnar(path) for path in paths]
+    if not tables:
+        return {**entries_to_columns([]), "file": np.zeros(0, dtype=np.int32), "files": np.array(paths, dtype=str)}
+
+    offsets = np.cumsum([0] + [len(t["categories"]) for t in tables[:-1]])
+    all_categories = np.concatenate([t["categories"] for t in tables])
+    categories, remap = np.unique(all_categories, return_inverse=True)
+    columns = {
+        name: np.concatenate([t[name] for t in tables])
+        for name in COLUMNS if name not in ("category", "categories")
+    }
+    columns["category"] = remap[np.concatenate([t["category"] + offset for t, offset in zip(tables, offsets)])]
+    columns["categories"] = categories
+    columns["file"] = np.repeat(np.arange(len(tables), dtype=np.int32), [len(t["severity"]) for t in tables])
+    columns["files"] = np.array(paths, dtype=str)
+    return columns
+
+def filter_mask(columns: dict, severity=None, category=None, since=None, until=None) -> np.ndarray:
+    mask = np.ones(len(columns["severity"]), dtype=bool)
+    if severity:
+        codes = np.flatnonzero(SEVERITIES == severity)
+        mask &= np.isin(columns["severity"], codes)
+    if category:
+        codes = np.flatnonzero(columns["categories"] == category)
+        mask &= np.isin(columns["category"], codes)
+    if since:
+        mask &= columns["timestamp"] >= np.datetime64(since, "s")
+    if until:
+        mask &= columns["timestamp"] < np.datetime64(until, "s")
+    return mask
+
+# Returns (key, number of entries, total occurrences) tuples sorted by occurrences
+def aggregate(columns: dict, group_by: str = "message_hash", mask=None, top=None) -> list:
+    if group_by not in GROUP_BY_KEYS:
+        raise ValueError(f"Invalid group by key '{group_by}'")
+    if mask is None:
+        mask = np.ones(len(columns["severity"]), dtype=bool)
+    keys, inverse = np.unique(columns[group_by][mask], return_inverse=True)
+    entries = np.bincount(inverse, minlength=len(keys))
+    occurrences = np.bincount(inverse, weights=columns["occurrences"][mask], minlength=len(keys)).astype(np.int64)
+    order = np.argsort(-occurrences, kind="stable")[:top]
+
+    if group_by == "message_hash":
+        # fixed width bytes drop trailing zero bytes, pad them back before formatting
+        labels = [key.ljust(32, b"\0").hex() for key in keys[order]]
+    elif group_by == "category":
+        labels = columns["categories"][keys[order]].tolist()
+    elif group_by == "severity":
+        labels = SEVERITIES[keys[order]].tolist()
+    else:
+        labels = columns["files"][keys[order]].tolist()
+    return list(zip(labels, entries[order].tolist(), occurrences[order].tolist()))
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description="Filter and aggregate parsed logfiles saved in the columnar (.npz) format.")
+    parser.add_argument("paths", nargs="+", help="Parsed .npz files or glob patterns (eg. 'data/logs/parsed_*.npz')")
+    parser.add_argument("--severity", default=None, help="Only entries with the given severity (Error, Warning, Traceback)")
+    parser.add_argument("--category", default=None, help="Only entries with the given category (eg. LogEngine)")
+    parser.add_argument("--since", default=None, help="Only entries logged at or after the given ISO timestamp")
+    parser.add_argument("--until", default=None, help="Only entries logged before the given ISO timestamp")
+    parser.add_argument("--group-by", default="message_hash", choices=GROUP_BY_KEYS, help="Column used for aggregation")
+    parser.add_argument("--top", type=int, default=20, help="Number of rows to print")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_arguments(sys.argv[1:])
+    paths = sorted({path for pattern in args.paths for path in glob.glob(pattern)})
+    columns = load_columnar(paths)
+    mask = filter_mask(columns, args.severity, args.category, args.since, args.until)
+    print(f"{len(paths)} files, {int(mask.sum())} matching entries")
+    for key, entries, occurrences in aggregate(columns, args.group_by, mask, args.top):
+        print(f"{occurrences:>10} {entries:>8}  {key}")
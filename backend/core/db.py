@@ -1,79 +1,266 @@
 from .logger import logger
 from .parser import get_log_hash
+from .retry import connect_with_retry
+from contextlib import contextmanager
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
+import threading
 import os
 
+POOL_MAX_SIZE = int(os.getenv("DB_INGEST_POOL_MAX_SIZE", "10"))
 
-def get_db_connection():
-    connection = psycopg2.connect(
+def create_db_pool():
+    return psycopg2.pool.ThreadedConnectionPool(
+        1,
+        POOL_MAX_SIZE,
         host=os.getenv("POSTGRES_HOST", "postgres"),
         dbname=os.getenv("POSTGRES_DB", "logs_db"),
         user=os.getenv("POSTGRES_USER", "user"),
         password=os.getenv("POSTGRES_PASSWORD", "pass"),
         cursor_factory=psycopg2.extras.RealDictCursor
     )
-    return connection
+
+_pool = None
+_pool_lock = threading.Lock()
+# the pool raises when it is exhausted, callers wait for a free connection instead
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_SIZE)
+
+# The pool is created on first use, so the app can start before Postgres is up
+def get_db_pool(attempts=None):
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = connect_with_retry(create_db_pool, "Postgres", attempts)
+    return _pool
+
+def close_db_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+# Every ingest and write runs on its own connection, so transactions of concurrent uploads and requests never mix
+@contextmanager
+def db_connection(attempts=None, timeout=None):
+    pool = get_db_pool(attempts)
+    if not _pool_slots.acquire(timeout=timeout):
+        raise psycopg2.pool.PoolError("No free Postgres connection")
+    connection = None
+    try:
+        connection = pool.getconn()
+        yield connection
+    finally:
+        if connection is not None:
+            try:
+                # nothing uncommitted is left behind for the next user of the connection
+                connection.rollback()
+            except psycopg2.Error:
+                pass
+            pool.putconn(connection, close=bool(connection.closed))
+        _pool_slots.release()
+
+def ping_db():
+    try:
+        with db_connection(attempts=1, timeout=1) as db:
+            db.cursor().execute("SELECT 1;")
+        return True
+    except Exception as e:
+        logger.warning(f"Postgres ping failed: {e}")
+        return False
 
 # db operations
-def insert_issue(message_hash, log_entry_id, message, timestamp, category, severity, line_number=None, status="open"):
+def insert_issue(db, message_hash, log_entry_id, message, timestamp, category, severity, line_number=None, status="open"):
+    cursor = db.cursor()
     cursor.execute("SELECT id FROM issues WHERE message_hash = %s", (message_hash,))
     existing = cursor.fetchone()
     if existing:
         return existing["id"], False
 
+    # another upload may insert the same issue at the same time, its row is used then
     cursor.execute("""
         INSERT INTO issues (message_hash, log_entry_id, message, timestamp, category, severity, line_number, status)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (message_hash) DO NOTHING
         RETURNING id;
     """, (message_hash, log_entry_id, message, timestamp, category, severity, line_number, status))
-    new_id = cursor.fetchone()["id"]
-    return new_id, True
+    inserted = cursor.fetchone()
+    if inserted:
+        return inserted["id"], True
+    cursor.execute("SELECT id FROM issues WHERE message_hash = %s", (message_hash,))
+    return cursor.fetchone()["id"], False
 
-def insert_traceback(event_id, message, line_number, hash):
-    cursor.execute("SELECT id FROM error_traceback WHERE hash = %s", (hash,))
-    existing = cursor.fetchone()
-    if existing:
-        return 
-    cursor.execute("""
-        INSERT INTO error_traceback (issue_id, message, line_number, hash)
-        VALUES (%s, %s, %s, %s)
-    """, (event_id, message, line_number, hash))
+# Interns all traceback lines into traceback_frames and stores every traceback as an array of frame ids, in a single statement
+def insert_tracebacks(cursor, tracebacks):
+    rows = [
+        (issue_id, line_number, position, get_log_hash(message), message)
+        for issue_id, line_number, messages in tracebacks
+        for position, message in enumerate(messages)
+    ]
+    if not rows:
+        return
+    psycopg2.extras.execute_values(cursor, """
+        WITH frame_rows (issue_id, line_number, position, hash, message) AS (VALUES %s),
+        frames AS (
+            -- DO UPDATE returns existing frames as well, also ones committed by a concurrent upload after this statement started
+            INSERT INTO traceback_frames (hash, message)
+            SELECT DISTINCT ON (hash) hash, message FROM frame_rows ORDER BY hash
+            ON CONFLICT (hash) DO UPDATE SET hash = EXCLUDED.hash
+            RETURNING id, hash
+        )
+        INSERT INTO issue_tracebacks (issue_id, line_number, frame_ids)
+        SELECT r.issue_id, MIN(r.line_number), ARRAY_AGG(frames.id ORDER BY r.position)
+        FROM frame_rows r
+        JOIN frames ON frames.hash = r.hash
+        GROUP BY r.issue_id
+        ON CONFLICT (issue_id) DO NOTHING;
+    """, rows, page_size=len(rows))
 
-def insert_parsed_logs_to_db(log_entries):
-    for entry in log_entries:
-        try:
-            traceback_exists = entry.get("traceback") and len(entry["traceback"]) > 0
-            severity = entry.get("severity", "warning")
-            
-            issue_id, is_new_issue = insert_issue(
-                message_hash=entry["message_hash"],
-                log_entry_id=entry["log_entry_id"],
-                message=entry["message"],
-                timestamp=entry["timestamp"],
-                category=entry["category"],
-                severity=severity,
-                line_number=entry.get("line_number")
-            )
+# The upload row is part of the ingest transaction, it is committed by complete_upload together with its issues
+def create_upload(db, filename, build=None, content_hash=None, dialect=None):
+    cursor = db.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO uploads (filename, build, content_hash, dialect) VALUES (%s, %s, %s, %s) RETURNING id;",
+            (filename, build, content_hash, dialect)
+        )
+        return cursor.fetchone()["id"]
+    except Exception as e:
+        db.rollback()
+        logger.error(f"DB error creating upload for {filename}: {e}")
+        raise
+
+# Marks the upload as fully processed and commits the ingest, only completed uploads are reused for identical uploads
+def complete_upload(db, upload_id, parsed):
+    cursor = db.cursor()
+    try:
+        cursor.execute("UPDATE uploads SET parsed = %s WHERE id = %s;", (parsed, upload_id))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"DB error completing upload {upload_id}: {e}")
+        raise
 
+# Registers an identical logfile uploaded for another build, its occurrences are copied from the already processed upload.
+# The new upload refers to the files of the processed one, its own copy of the logfile is not kept
+def copy_upload(db, source_upload_id, build):
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO uploads (filename, build, content_hash, dialect, parsed)
+            SELECT filename, %s, content_hash, dialect, parsed FROM uploads WHERE id = %s
+            RETURNING id;
+        """, (build, source_upload_id))
+        upload_id = cursor.fetchone()["id"]
+        cursor.execute("""
+            INSERT INTO issue_occurrences (issue_id, upload_id, count)
+            SELECT issue_id, %s, count FROM issue_occurrences WHERE upload_id = %s
+            RETURNING issue_id;
+        """, (upload_id, source_upload_id))
+        lock_issues(cursor, [row["issue_id"] for row in cursor.fetchall()])
+        cursor.execute("""
+            UPDATE issues
+            SET occurrence_count = issues.occurrence_count + o.count,
+                last_seen_upload_id = o.upload_id
+            FROM issue_occurrences o
+            WHERE o.upload_id = %s AND issues.id = o.issue_id;
+        """, (upload_id,))
+        db.commit()
+        return upload_id
+    except Exception as e:
+        db.rollback()
+        logger.error(f"DB error copying upload {source_upload_id} for build {build}: {e}")
+        raise
+
+# Concurrent uploads update the counters of the same issues, locking them in id order first keeps them from deadlocking
+def lock_issues(cursor, issue_ids):
+    cursor.execute("SELECT id FROM issues WHERE id = ANY(%s) ORDER BY id FOR NO KEY UPDATE;", (list(issue_ids),))
+
+def insert_issue_occurrences(cursor, upload_id, occurrence_counts):
+    if not occurrence_counts:
+        return
+    rows = [(issue_id, upload_id, count) for issue_id, count in occurrence_counts.items()]
+    lock_issues(cursor, occurrence_counts)
+    psycopg2.extras.execute_values(cursor, """
+        INSERT INTO issue_occurrences (issue_id, upload_id, count)
+        VALUES %s
+        ON CONFLICT (issue_id, upload_id) DO UPDATE SET count = issue_occurrences.count + EXCLUDED.count;
+    """, rows, page_size=len(rows))
+    psycopg2.extras.execute_values(cursor, """
+        UPDATE issues
+        SET occurrence_count = issues.occurrence_count + v.count,
+            last_seen_upload_id = v.upload_id
+        FROM (VALUES %s) AS v (issue_id, upload_id, count)
+        WHERE issues.id = v.issue_id;
+    """, rows, page_size=len(rows))
+
+# Inserts all issues of an upload at once and returns {message_hash: (issue_id, is_new_issue)}.
+# Rows are inserted in message_hash order, so concurrent uploads wait on each others new issues in the same order and never deadlock
+def insert_issues(cursor, log_entries):
+    hashes = list({entry["message_hash"] for entry in log_entries})
+    if not hashes:
+        return {}
+    cursor.execute("SELECT id, message_hash FROM issues WHERE message_hash = ANY(%s);", (hashes,))
+    issue_ids = {row["message_hash"]: (row["id"], False) for row in cursor.fetchall()}
+
+    rows = [
+        (entry["message_hash"], entry["log_entry_id"], entry["message"], entry["timestamp"],
+         entry["category"], entry.get("severity", "warning"), entry.get("line_number"))
+        for entry in log_entries if entry["message_hash"] not in issue_ids
+    ]
+    if rows:
+        inserted = psycopg2.extras.execute_values(cursor, """
+            INSERT INTO issues (message_hash, log_entry_id, message, timestamp, category, severity, line_number)
+            SELECT DISTINCT ON (message_hash) * FROM (VALUES %s) AS v (message_hash, log_entry_id, message, timestamp, category, severity, line_number)
+            ORDER BY message_hash
+            ON CONFLICT (message_hash) DO NOTHING
+            RETURNING id, message_hash;
+        """, rows, template="(%s, %s, %s, %s::timestamp, %s, %s, %s::int)", page_size=len(rows), fetch=True)
+        issue_ids.update({row["message_hash"]: (row["id"], True) for row in inserted})
+
+    # issues committed by a concurrent upload while inserting are not returned by the insert
+    missing = [message_hash for message_hash in hashes if message_hash not in issue_ids]
+    if missing:
+        cursor.execute("SELECT id, message_hash FROM issues WHERE message_hash = ANY(%s);", (missing,))
+        issue_ids.update({row["message_hash"]: (row["id"], False) for row in cursor.fetchall()})
+    return issue_ids
+
+# Issues, tracebacks and occurrence counts of an upload are written in a single transaction,
+# if any of them fails nothing is kept, so the counts of an upload are never partial.
+# Nothing is committed when upload_id is given, complete_upload commits the whole ingest
+def insert_parsed_logs_to_db(db, log_entries, upload_id=None):
+    cursor = db.cursor()
+    occurrence_counts = {}
+    tracebacks = []
+    try:
+        issue_ids = insert_issues(cursor, log_entries)
+        for entry in log_entries:
+            issue_id, is_new_issue = issue_ids[entry["message_hash"]]
+            occurrence_counts[issue_id] = occurrence_counts.get(issue_id, 0) + entry.get("occurrences", 1)
+
+            traceback_exists = entry.get("traceback") and len(entry["traceback"]) > 0
             if is_new_issue and traceback_exists:
-                for i, tb_message in enumerate(entry["traceback"]):
-                    insert_traceback(
-                        event_id=issue_id,
-                        message=tb_message["message"] if isinstance(tb_message, dict) else str(tb_message),
-                        line_number=entry.get("line_number", 0) + i,
-                        hash=get_log_hash(tb_message["message"])
-                    )
-                    logger.debug(f"Inserted traceback line for issue_id={issue_id}")
-
-        except Exception as e:
-            logger.error(f"Caught exception: {e}\nDB insert failed at line {entry.get('line_number')}")
-            db.rollback()
-
-    db.commit()
-
-def delete_specified_issue(issue_id):
-    try:        
+                messages = [tb["message"] if isinstance(tb, dict) else str(tb) for tb in entry["traceback"]]
+                tracebacks.append((issue_id, entry.get("line_number", 0), messages))
+                # only the first entry of a new issue stores its traceback
+                issue_ids[entry["message_hash"]] = (issue_id, False)
+
+        insert_tracebacks(cursor, tracebacks)
+        logger.debug(f"Inserted {len(issue_ids)} issues and {len(tracebacks)} tracebacks")
+        if upload_id is not None:
+            insert_issue_occurrences(cursor, upload_id, occurrence_counts)
+        else:
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Caught exception: {e}\nDB insert failed for upload {upload_id}")
+        raise
+
+def delete_specified_issue(db, issue_id):
+    cursor = db.cursor()
+    try:
         cursor.execute("DELETE FROM issues WHERE id = %s RETURNING id;", (issue_id,))
         deleted = cursor.fetchone()
         db.commit()
@@ -84,7 +271,8 @@ def delete_specified_issue(issue_id):
         logger.error(f"DB error deleting issue {issue_id}: {e}")
         raise
 
-def update_issue_status(issue_id, new_status):
+def update_issue_status(db, issue_id, new_status):
+    cursor = db.cursor()
     if new_status not in ["open", "closed"]:
         raise ValueError("Invalid status")
 
@@ -100,48 +288,3 @@ def update_issue_status(issue_id, new_status):
         db.rollback()
         logger.error(f"DB error updating issue status: {e}")
         raise
-
-def get_issues(status=None):
-    if status and status not in ["open", "closed"]:
-        raise ValueError("Invalid status filter")
-    try:
-        if status:
-            cursor.execute("SELECT * FROM issues WHERE status = %s;", (status,))
-        else:
-            cursor.execute("SELECT * FROM issues;")
-        rows = cursor.fetchall()
-        return [
-            {
-                "id": row.get("id"),
-                "log_entry_id": row.get("log_entry_id"),
-                "message": row.get("message"),
-                "category": row.get("category", "unknown"),
-                "timestamp": row.get("timestamp", None),
-                "status": row.get("status", "open"),
-            }
-            for row in rows
-        ]
-    except Exception as e:
-        logger.error(f"DB error fetching issues: {e}")
-        raise
-
-def get_issue_by_id(issue_id: str):
-    try:
-        cursor.execute("SELECT * FROM issues WHERE id = %s;", (issue_id,))
-        issue = cursor.fetchone()
-        if not issue:
-            return None
-        return {
-            "id": issue.get("id"),
-            "log_entry_id": issue.get("log_entry_id"),
-            "message": issue.get("message"),
-            "category": issue.get("category", "unknown"),
-            "timestamp": issue.get("timestamp", None),
-            "status": issue.get("status", "open"),
-        }
-    except Exception as e:
-        logger.error(f"DB error fetching issue by ID {issue_id}: {e}")
-        raise
-
-db = get_db_connection()
-cursor = db.cursor()
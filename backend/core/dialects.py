@@ -0,0 +1,220 @@
+from functools import lru_cache
+from itertools import islice
+from .logger import logger
+import builtins
+import json
+import re
+import os
+
+DIALECTS_FILE = os.getenv("LOG_DIALECTS_FILE", "/app/data/dialects.json")
+DEFAULT_DIALECT = "ue_editor"
+HEADER_LINES = 50
+
+# Trigger kinds recognized by the parser
+IGNORE = "ignore"
+TRACEBACK_START = "traceback_start"
+TRACEBACK_CONTINUE = "traceback_continue"
+TRACEBACK_END = "traceback_end"
+CALLSTACK_START = "callstack_start"
+RULE_KINDS = (IGNORE, TRACEBACK_START, TRACEBACK_CONTINUE, TRACEBACK_END, CALLSTACK_START)
+
+UE_RULES = {
+    IGNORE: ["Display: Warning/Error Summary (Unique only)",
+             "Display: NOTE: Only first 50 warnings displayed.",
+             "To disable this warning set",
+             "Login successful"],
+    TRACEBACK_START: ["traceback (most recent call last)", "commandletexception", "btraceack", "=== critical error: ==="],
+    TRACEBACK_CONTINUE: ["unhandled exception:", "fatal error!"],
+    TRACEBACK_END: ["executing staticshutdownaftererror"],
+    CALLSTACK_START: ["callstack:"],
+}
+
+# "ValueError: message" lines of the built-in exceptions, unlike a plain "error:" they never match UE "LogX: Error:" lines
+PYTHON_EXCEPTION_LINES = sorted(
+    f"{name.lower()}:" for name, value in vars(builtins).items()
+    if isinstance(value, type) and issubclass(value, BaseException)
+    and not issubclass(value, Warning) and value not in (BaseException, Exception)
+)
+
+# "detect" phrases are looked up in the log header to pick the dialect automatically
+DIALECT_PROFILES = {
+    "ue_editor": {
+        "detect": ["log file open", "loginit:"],
+        "rules": UE_RULES,
+    },
+    "cook": {
+        "extends": "ue_editor",
+        "detect": ["-run=cook", "logcook:"],
+        "rules": {},
+    },
+    "ubt": {
+        "extends": "ue_editor",
+        # UnrealBuildTool invocation lines, a plain mention of UnrealBuildTool also shows up in editor logs
+        "detect": ["running unrealbuildtool:", "unrealbuildtool.dll", "unrealbuildtool.exe"],
+        "rules": {
+            # "unhandled exception:" alone continues an editor crash block, only a .NET exception starts a new traceback
+            TRACEBACK_START: ["unhandled exception: system."],
+        },
+    },
+    "python": {
+        # Python tracebacks show up in editor logs too (eg. from editor scripts), so the UE rules are kept
+        "extends": "ue_editor",
+        "detect": ["traceback (most recent call last)"],
+        "rules": {
+            # frame lines, the source line after a frame is kept with it. Carets mark the failing expression since Python 3.11
+            TRACEBACK_CONTINUE: ['  file "', "^^"],
+            # the exception line closes the traceback and becomes the issue message
+            TRACEBACK_END: PYTHON_EXCEPTION_LINES,
+        },
+    },
+}
+
+
+class TriggerMatcher:
+    """All trigger phrases of a dialect compiled into a single regex, so each line is scanned once."""
+
+    def __init__(self, name: str, rules: dict):
+        self.name = name
+        self.kinds_by_phrase = {}
+        for kind, phrases in rules.items():
+            for phrase in phrases:
+                self.kinds_by_phrase.setdefault(phrase.lower(), set()).add(kind)
+
+        # the alternation reports a single phrase per position, so every phrase also carries the kinds of the phrases it contains
+        for phrase, kinds in self.kinds_by_phrase.items():
+            for other, other_kinds in self.kinds_by_phrase.items():
+                if other != phrase and other in phrase:
+                    kinds |= other_kinds
+
+        # longest phrases first, so a phrase containing a shorter one wins the alternation
+        phrases = sorted(self.kinds_by_phrase, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(p) for p in phrases)) if phrases else None
+
+    def scan(self, line_lower: str) -> set:
+        kinds = set()
+        if self.pattern is None:
+            return kinds
+        # after a match the search continues from the next character, so partially overlapping phrases are found too
+        match = self.pattern.search(line_lower)
+        while match:
+            kinds.update(self.kinds_by_phrase[match.group(0)])
+            match = self.pattern.search(line_lower, match.start() + 1)
+        return kinds
+
+
+def load_dialect_profiles() -> dict:
+    profiles = {name: dict(profile) for name, profile in DIALECT_PROFILES.items()}
+    if os.path.exists(DIALECTS_FILE):
+        try:
+            with open(DIALECTS_FILE, "r", encoding="utf-8") as f:
+                custom_profiles = json.load(f)
+            if not isinstance(custom_profiles, dict):
+                raise ValueError("expected an object of dialect profiles")
+            for name, profile in custom_profiles.items():
+                error = validate_profile(profile)
+                if error:
+                    logger.error(f"Skipping dialect '{name}' from {DIALECTS_FILE}: {error}")
+                    continue
+                if name in profiles:
+                    # project rules are added on top of the built-in profile of the same name
+                    merged = dict(profiles[name])
+                    merged["detect"] = merged.get("detect", []) + profile.get("detect", [])
+                    merged["rules"] = merge_rules(merged.get("rules", {}), profile.get("rules", {}))
+                    profiles[name] = merged
+                else:
+                    profiles[name] = profile
+            logger.info(f"Loaded custom dialect profiles from {DIALECTS_FILE}")
+        except Exception as e:
+            logger.error(f"Error loading dialect profiles from {DIALECTS_FILE}: {e}")
+
+    # checked against all loaded profiles at once, a profile extending a skipped one is skipped as well
+    invalid = {name: inheritance_error(profiles, name) for name in profiles}
+    for name, error in invalid.items():
+        if error:
+            logger.error(f"Skipping dialect '{name}': {error}")
+            del profiles[name]
+    return profiles
+
+def is_phrase_list(value) -> bool:
+    return isinstance(value, list) and all(isinstance(phrase, str) and phrase for phrase in value)
+
+def validate_profile(profile) -> str | None:
+    if not isinstance(profile, dict):
+        return "profile must be an object"
+    if not is_phrase_list(profile.get("detect", [])):
+        return "'detect' must be a list of non-empty strings"
+    if "extends" in profile and not isinstance(profile["extends"], str):
+        return "'extends' must be a dialect name"
+    rules = profile.get("rules", {})
+    if not isinstance(rules, dict):
+        return "'rules' must be an object"
+    for kind, phrases in rules.items():
+        if kind not in RULE_KINDS:
+            return f"unknown rule kind '{kind}', expected one of {', '.join(RULE_KINDS)}"
+        if not is_phrase_list(phrases):
+            return f"'{kind}' rules must be a list of non-empty strings"
+    return None
+
+def inheritance_error(profiles: dict, name: str) -> str | None:
+    seen = set()
+    while name is not None:
+        if name in seen:
+            return f"circular dialect inheritance at '{name}'"
+        if name not in profiles:
+            return f"extends unknown dialect '{name}'"
+        seen.add(name)
+        name = profiles[name].get("extends")
+    return None
+
+def merge_rules(base: dict, extra: dict) -> dict:
+    merged = {kind: list(phrases) for kind, phrases in base.items()}
+    for kind, phrases in extra.items():
+        merged.setdefault(kind, []).extend(phrases)
+    return merged
+
+def resolve_rules(profiles: dict, name: str, seen=None) -> dict:
+    seen = seen or set()
+    if name in seen:
+        raise ValueError(f"Circular dialect inheritance at '{name}'")
+    seen.add(name)
+    profile = profiles[name]
+    rules = profile.get("rules", {})
+    parent = profile.get("extends")
+    if parent:
+        inherited = resolve_rules(profiles, parent, seen)
+        # the parser checks starts before continues, a start on an inherited continue phrase would restart every crash block
+        continue_phrases = {phrase.lower() for phrase in inherited.get(TRACEBACK_CONTINUE, [])}
+        starts = rules.get(TRACEBACK_START, [])
+        if any(phrase.lower() in continue_phrases for phrase in starts):
+            logger.warning(f"Dialect '{name}' ignores traceback_start phrases that are traceback_continue phrases of '{parent}'")
+            rules = {**rules, TRACEBACK_START: [phrase for phrase in starts if phrase.lower() not in continue_phrases]}
+        return merge_rules(inherited, rules)
+    return merge_rules({}, rules)
+
+@lru_cache(maxsize=None)
+def get_profiles() -> dict:
+    return load_dialect_profiles()
+
+@lru_cache(maxsize=None)
+def get_dialect_matcher(name: str = DEFAULT_DIALECT) -> TriggerMatcher:
+    profiles = get_profiles()
+    if name not in profiles:
+        raise ValueError(f"Unknown log dialect '{name}'")
+    return TriggerMatcher(name, resolve_rules(profiles, name))
+
+def compile_dialects():
+    for name in get_profiles():
+        get_dialect_matcher(name)
+
+def detect_file_dialect(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return detect_dialect(list(islice(f, HEADER_LINES)))
+
+def detect_dialect(lines: list) -> str:
+    header = "".join(lines[:HEADER_LINES]).lower()
+    profiles = get_profiles()
+    # the most specific match wins: profiles that extend another one are checked first
+    for name in sorted(profiles, key=lambda n: profiles[n].get("extends") is None):
+        if any(phrase.lower() in header for phrase in profiles[name].get("detect", [])):
+            return name
+    return DEFAULT_DIALECT
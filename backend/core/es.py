@@ -2,6 +2,8 @@ from elasticsearch import Elasticsearch
 from datetime import datetime, timezone
 from .logger import logger
 from .parser import timestamp_match, generate_log_id_hash
+from .retry import connect_with_retry
+import threading
 import os
 
 DEFAULT_INDEX="logs"
@@ -9,10 +11,29 @@ DEFAULT_INDEX="logs"
 def get_es_connection():
     return Elasticsearch(os.getenv("ELASTIC_URL", "http://elasticsearch:9200"))
 
+_es = None
+_es_lock = threading.Lock()
+
+def connect_es():
+    client = get_es_connection()
+    if not client.ping():
+        raise ConnectionError("Elasticsearch ping failed")
+    return client
+
+# The client is created on first use, so the app can start before Elasticsearch is up
+def get_es(attempts=None):
+    global _es
+    if _es is None:
+        with _es_lock:
+            if _es is None:
+                _es = connect_with_retry(connect_es, "Elasticsearch", attempts)
+    return _es
+
 def insert_logfile_to_es(logfile):
     with open(logfile, 'r') as f:
         lines = f.readlines()
     basename = os.path.basename(logfile)
+    es = get_es()
     for i, line in enumerate(lines):
         timestamp , _= timestamp_match(line)
         log = {
@@ -30,29 +51,3 @@ def insert_logfile_to_es(logfile):
             "@timestamp": datetime.now(timezone.utc).isoformat()
         }
         es.index(index=DEFAULT_INDEX, id=log_id, body=doc)
-
-def fetch_log_entry(log_entry_id: str):
-    try:
-        res = es.get(index=DEFAULT_INDEX, id=log_entry_id)
-        return res["_source"]
-    except Exception as e:
-        logger.error(f"Error retrieving log entry {log_entry_id}: {e}")
-        return None
-
-def fetch_log_line_number(log_id: str):
-    try:
-        res = es.get(index=DEFAULT_INDEX, id=log_id)
-        return res["_source"].get("line_number")
-    except Exception as e:
-        logger.error(f"Error retrieving line number for log {log_id}: {e}")
-        return None
-
-def fetch_log_datetime(log_id: str):
-    try:
-        res = es.get(index=DEFAULT_INDEX, id=log_id)
-        return res["_source"].get("@timestamp")
-    except Exception as e:
-        logger.error(f"Error retrieving timestamp for log {log_id}: {e}")
-        return None
-
-es = get_es_connection()
@@ -1,5 +1,6 @@
 from datetime import datetime
 from .logger import logger
+from .dialects import get_dialect_matcher, detect_dialect, IGNORE, TRACEBACK_START, TRACEBACK_CONTINUE, TRACEBACK_END, CALLSTACK_START
 import hashlib
 import base64
 import json
@@ -7,8 +8,6 @@ import re
 import os
 
 def parse_line(line: str, line_number: int, filename: str):
-    if is_not_relevent_line(line):
-        return 
     category = None
     log_severity = None
     timestamp, message = timestamp_match(line)
@@ -81,13 +80,18 @@ def parse_line(line: str, line_number: int, filename: str):
     }
 
 
-def parse_log_file(path: str) -> list:
+def parse_log_file(path: str, dialect: str | None = None) -> list:
     if not os.path.exists(path):
         return []
 
     with open(path, "r", encoding="utf-8") as f:
         lines = f.readlines()
 
+    if dialect is None:
+        dialect = detect_dialect(lines)
+    matcher = get_dialect_matcher(dialect)
+    logger.info(f"Parsing {os.path.basename(path)} as '{dialect}' log")
+
     current_error = None
     parsed_entries = []
     traceback_array = []
@@ -99,6 +103,10 @@ def parse_log_file(path: str) -> list:
     current_callstack_file = ""
 
     for i, line in enumerate(lines):
+        line_lower = line.lower()
+        triggers = matcher.scan(line_lower)
+        if IGNORE in triggers:
+            continue
         parsed = parse_line(line, i + 1, path)
         if parsed is None:
             continue
@@ -107,21 +115,22 @@ def parse_log_file(path: str) -> list:
         if "Error(s)" in line and "Warning(s)" in line: # This kind of line we skip
             continue
 
-        line_lower = line.lower()
-        if ("traceback (most recent call last)" in line_lower or "commandletexception" in line_lower or "btraceack" in line_lower or "=== critical error: ===" in line_lower):
+        if TRACEBACK_START in triggers:
             collecting_traceback = True
             traceback_array = [parsed]
             continue
 
         if collecting_traceback:
-            if "executing staticshutdownaftererror" in line_lower:
+            if TRACEBACK_END in triggers:
                 traceback_array.append(parsed)
                 parsed_entries.append(finalize_traceback(traceback_array))
                 traceback_array = []
                 collecting_traceback = False
                 continue
-            if "unhandled exception:" in line_lower or "fatal error!" in line_lower:
+            if TRACEBACK_CONTINUE in triggers:
                 traceback_array.append(parsed)
+                # the line following a continue line belongs to it (eg. the source line under a python frame)
+                traceback_after_sep = 1
                 continue
             if parsed.get("category") == "Separator":
                 traceback_array.append(parsed)
@@ -149,7 +158,7 @@ def parse_log_file(path: str) -> list:
                 continue
 
         # Handle warning + callstack collection
-        if "callstack:" in line_lower and parsed["severity"] == "Warning":
+        if CALLSTACK_START in triggers and parsed["severity"] == "Warning":
             collecting_callstack = True
             callstack_entry = parsed.copy()
             callstack_entry["traceback"] = []
@@ -254,15 +263,6 @@ def strip_prefix_if_present(message: str, prefix: str) -> str:
 def parse_retry_message(message: str) -> str:
     return re.sub(r"(Trying again in )\d+(\s+seconds)", r"\1x\2", message)
 
-def is_not_relevent_line(line: str) -> bool:
-    non_relevant_lines = ["Display: Warning/Error Summary (Unique only)",
-                          "Display: NOTE: Only first 50 warnings displayed.",
-                          "To disable this warning set",
-                          "Login successful"]
-    for l in non_relevant_lines:
-        if l in line:
-            return True
-
 def parse_category_from_line(line: str) -> str | None:
     cleaned_line = remove_bracket_prefixes(line).lstrip()
     # Explicit catch exception names
@@ -0,0 +1,37 @@
+from .logger import logger
+import asyncio
+import time
+import os
+
+CONNECT_RETRIES = int(os.getenv("BACKEND_CONNECT_RETRIES", "5"))
+CONNECT_BACKOFF = float(os.getenv("BACKEND_CONNECT_BACKOFF", "0.5"))
+CONNECT_BACKOFF_MAX = 8.0
+
+# Calls connect() until it succeeds, waiting with exponential backoff between a bounded number of attempts
+def connect_with_retry(connect, name: str, attempts: int | None = None):
+    attempts = attempts or CONNECT_RETRIES
+    delay = CONNECT_BACKOFF
+    for attempt in range(1, attempts + 1):
+        try:
+            return connect()
+        except Exception as e:
+            if attempt == attempts:
+                logger.error(f"Could not connect to {name} after {attempts} attempts: {e}")
+                raise
+            logger.warning(f"{name} not available (attempt {attempt}/{attempts}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, CONNECT_BACKOFF_MAX)
+
+async def async_connect_with_retry(connect, name: str, attempts: int | None = None):
+    attempts = attempts or CONNECT_RETRIES
+    delay = CONNECT_BACKOFF
+    for attempt in range(1, attempts + 1):
+        try:
+            return await connect()
+        except Exception as e:
+            if attempt == attempts:
+                logger.error(f"Could not connect to {name} after {attempts} attempts: {e}")
+                raise
+            logger.warning(f"{name} not available (attempt {attempt}/{attempts}), retrying in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CONNECT_BACKOFF_MAX)
@@ -0,0 +1,43 @@
+from .logger import logger
+from .dialects import compile_dialects
+from .db import get_db_pool, close_db_pool
+from .es import get_es
+from .async_db import get_pool, close_pool
+from .async_es import get_async_es, close_async_es
+import asyncio
+import time
+import os
+
+WARM_UP_INTERVAL = float(os.getenv("WARM_UP_INTERVAL", "2"))
+
+_ready = False
+
+def is_ready():
+    return _ready
+
+# Compiles the parser rules and opens the backend connections and pools before the app reports ready
+async def warm_up():
+    global _ready
+    started = time.monotonic()
+    try:
+        await asyncio.to_thread(compile_dialects)
+    except Exception as e:
+        # the rules are compiled again on first use, the upload using a broken dialect fails instead of the whole app
+        logger.error(f"Compiling log dialects failed: {e}")
+    while True:
+        try:
+            await asyncio.to_thread(get_db_pool)
+            await asyncio.to_thread(get_es)
+            await get_pool()
+            await get_async_es()
+            break
+        except Exception as e:
+            logger.warning(f"Warm-up waiting for backends: {e}")
+            await asyncio.sleep(WARM_UP_INTERVAL)
+    _ready = True
+    logger.info(f"Warm-up finished in {time.monotonic() - started:.2f}s, app is ready")
+
+async def shut_down():
+    await asyncio.to_thread(close_db_pool)
+    await close_pool()
+    await close_async_es()
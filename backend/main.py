@@ -1,9 +1,20 @@
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
 from core.middleware import MaxSizeLimitMiddleware
+from core.startup import warm_up, shut_down
 from api import endpoints
+import asyncio
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm-up runs in the background, requests are accepted right away and /readyz reports when it is done
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    await shut_down()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(MaxSizeLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
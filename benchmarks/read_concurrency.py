@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+import statistics
+import threading
+import argparse
+import requests
+import logging
+import random
+import time
+import sys
+import os
+
+API_URL = "http://localhost:8000"
+GENERATED_LOG = os.path.join(os.getcwd(), "data", "benchmark_upload.log")
+
+logging.basicConfig(level=logging.INFO)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Measures read endpoint throughput while idle and while a large logfile is being ingested.")
+    parser.add_argument("--url", default=API_URL, help="Backend API url")
+    parser.add_argument("--logfile", default=None, help="Logfile uploaded during the loaded phase. A log is generated when not provided.")
+    parser.add_argument("--lines", type=int, default=60000, help="Number of lines of the generated logfile")
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent readers")
+    parser.add_argument("--duration", type=float, default=10.0, help="Length of the idle phase in seconds")
+    parser.add_argument("--endpoint", action="append", default=None, help="Read endpoint to request, can be repeated (default: /issues?status=open, /issues/top)")
+    return parser.parse_args(sys.argv[1:])
+
+# Warnings and errors with a handful of distinct messages, so the upload has real parse/insert work
+def generate_logfile(path, lines):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    run_id = random.randint(0, 1_000_000) # unique content, so the upload is not skipped as a duplicate
+    with open(path, "w") as f:
+        f.write(f"Log file open, benchmark run {run_id}\n")
+        for i in range(lines):
+            if i % 3 == 0:
+                f.write(f"[2024.01.01-12.00.00:{i % 1000:03d}][  0]LogStreaming: Warning: Failed to load asset /Game/Asset_{i % 500}\n")
+            elif i % 3 == 1:
+                f.write(f"[2024.01.01-12.00.00:{i % 1000:03d}][  0]LogCore: Error: Assertion failed in module {i % 200}\n")
+            else:
+                f.write(f"[2024.01.01-12.00.00:{i % 1000:03d}][  0]LogInit: Display: Loading module {i}\n")
+    return path
+
+def reader(url, endpoints, stop, latencies, errors):
+    session = requests.Session()
+    while not stop.is_set():
+        endpoint = random.choice(endpoints)
+        started = time.perf_counter()
+        try:
+            response = session.get(url + endpoint, timeout=30)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            errors.append(endpoint)
+
+def run_phase(name, url, endpoints, concurrency, until):
+    stop = threading.Event()
+    latencies, errors = [], []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(reader, url, endpoints, stop, latencies, errors)
+        until()
+        stop.set()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "phase": name,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0,
+    }
+    logging.info(f"{name:>10}: {result['rps']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  errors {result['errors']}")
+    return result
+
+def upload(url, logfile):
+    with open(logfile, "rb") as f:
+        response = requests.post(url + "/logs", files={"file": (os.path.basename(logfile), f)}, timeout=600)
+    logging.info(f"Upload finished with status code {response.status_code}: {response.text[:200]}")
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    endpoints = args.endpoint or ["/issues?status=open", "/issues/top"]
+    logfile = args.logfile or generate_logfile(GENERATED_LOG, args.lines)
+
+    idle = run_phase("idle", args.url, endpoints, args.concurrency, lambda: time.sleep(args.duration))
+    loaded = run_phase("ingesting", args.url, endpoints, args.concurrency, lambda: upload(args.url, logfile))
+
+    if idle["rps"]:
+        logging.info(f"Read throughput during ingest: {loaded['rps'] / idle['rps'] * 100:.0f}% of idle")
@@ -17,17 +17,19 @@ def parse_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument("--clean", action="store_true", default=False,help="Clean logfiles, remove attached volumes. Use when want to do a clean start of te project.")
     parser.add_argument("--insert-logfile", metavar="regexp", nargs="?", const="", default=None, help="Path to the logfile to parse and insert (--insert-logfile='<file_path>') Can place multiple logfiles separated by `,` Each logfile can be 10 mb max.")
+    parser.add_argument("--build", default=None, help="Optional build identifier attached to the inserted logfiles (--build='<build_id>')")
 
     return parser.parse_args(sys.argv[1:])
 
-def insert_log(logfiles):
+def insert_log(logfiles, build=None):
     files = logfiles.split(',')
     for file in files:
         if os.path.exists(os.path.join(file)):
             logging.info(f"logfile: {file} exists.")
             with open(file, "rb")as f:
                 file_to_upload = {"file": (file, f)}
-                response = requests.post(LOGS_ENDPOINT, files=file_to_upload)
+                data = {"build": build} if build else None
+                response = requests.post(LOGS_ENDPOINT, files=file_to_upload, data=data)
             logging.info(f"Response status code: {response.status_code}")
         else:
             logging.warning(f"File at path: {file}\nDoes not exist.")
@@ -52,7 +54,7 @@ if __name__ == "__main__":
     if switches.clean:
         clean_parsed_logfile_contents()
     elif switches.insert_logfile:
-        insert_log(switches.insert_logfile)
+        insert_log(switches.insert_logfile, switches.build)
     else:
         logging.info(f"Please sellect appropriate flag while running the script:\n--clean\n--insert-logfile=<logfile_path>")
     
\ No newline at end of file
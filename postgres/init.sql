@@ -4,16 +4,50 @@ CREATE TABLE IF NOT EXISTS issues (
     category TEXT, -- Log type specific (LogEngine etc...)
     severity TEXT NOT NULL, -- 'error' or 'warning'
     message TEXT,
-    timestamp TIMESTAMP, 
+    timestamp TIMESTAMP,
     line_number INT,
     message_hash TEXT UNIQUE,
-    status TEXT DEFAULT 'open' -- 'open' or 'closed'
+    status TEXT DEFAULT 'open', -- 'open' or 'closed'
+    occurrence_count BIGINT NOT NULL DEFAULT 0, -- total occurrences across all uploads
+    last_seen_upload_id INT -- most recent upload the issue was found in
 );
 
-CREATE TABLE IF NOT EXISTS error_traceback (
+CREATE INDEX IF NOT EXISTS idx_issues_occurrence_count ON issues (occurrence_count DESC);
+
+-- Every distinct traceback line is stored once and shared between tracebacks
+CREATE TABLE IF NOT EXISTS traceback_frames (
     id SERIAL PRIMARY KEY,
-    issue_id INT REFERENCES issues(id),
-    message TEXT NOT NULL,
-    line_number INT,
-    hash TEXT UNIQUE
+    hash TEXT UNIQUE NOT NULL, -- hash of the message
+    message TEXT NOT NULL
+);
+
+-- Traceback of an issue as an ordered array of frame ids
+CREATE TABLE IF NOT EXISTS issue_tracebacks (
+    issue_id INT PRIMARY KEY REFERENCES issues(id) ON DELETE CASCADE,
+    line_number INT, -- line number of the first frame
+    frame_ids INT[] NOT NULL
 );
+
+-- Every processed logfile is a single upload (build)
+CREATE TABLE IF NOT EXISTS uploads (
+    id SERIAL PRIMARY KEY,
+    filename TEXT NOT NULL,
+    build TEXT, -- optional build identifier provided by the uploader
+    content_hash TEXT, -- sha256 of the uploaded file
+    dialect TEXT, -- log dialect the file was parsed with
+    parsed INT, -- number of parsed entries, NULL until the upload is fully processed
+    uploaded_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_uploads_uploaded_at ON uploads (uploaded_at);
+CREATE INDEX IF NOT EXISTS idx_uploads_content_hash ON uploads (content_hash);
+
+-- How many times an issue occurred in a given upload
+CREATE TABLE IF NOT EXISTS issue_occurrences (
+    issue_id INT NOT NULL REFERENCES issues(id) ON DELETE CASCADE,
+    upload_id INT NOT NULL REFERENCES uploads(id) ON DELETE CASCADE,
+    count INT NOT NULL,
+    PRIMARY KEY (issue_id, upload_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_issue_occurrences_upload ON issue_occurrences (upload_id, issue_id);